@@ -1,4 +1,21 @@
 #!/usr/bin/env python3
+import importlib
+
+# Submodules pull in troposphere, which dominates import
+# time. Load them on first attribute access (PEP 562) so that
+# `import tropolib` stays cheap for tools that only use part of the
+# library, such as Lambda-packaged generators.
+_SUBMODULES = ("apigatewayv2", "ec2")
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_SUBMODULES))
 
 
 if __name__ == "__main__":
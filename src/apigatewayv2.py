@@ -1,14 +1,58 @@
 #!/usr/bin/env python3
+import functools
 import json
-from troposphere import Ref, Join, Region, AccountId
+
+from troposphere import Ref, Join, Sub
 from troposphere import apigatewayv2 as t_apigw2
-from pawslib.var import alphanum
+from .var import alphanum
+
+# alphanum() is pure and gets called with the same paths and stage
+# names repeatedly when building large APIs, so cache its results
+_alphanum = functools.lru_cache(maxsize=4096)(alphanum)
+
+# Access log formats are fixed strings, build them once at import time
+# instead of on every add_stage() call
+_CLF_LOG_FORMAT = '$context.identity.sourceIp - - [$context.requestTime] "$context.httpMethod $context.routeKey $context.protocol" $context.status $context.responseLength $context.requestId'  # noqa: E501
+_JSON_LOG_FORMAT = json.dumps(
+    {
+        "requestId": "$context.requestId",
+        "ip": "$context.identity.sourceIp",
+        "requestTime": "$context.requestTime",
+        "httpMethod": "$context.httpMethod",
+        "routeKey": "$context.routeKey",
+        "status": "$context.status",
+        "protocol": "$context.protocol",
+        "responseLength": "$context.responseLength",
+    }
+)
+_XML_LOG_FORMAT = '<request id="$context.requestId"> <ip>$context.identity.sourceIp</ip> <requestTime>$context.requestTime</requestTime> <httpMethod>$context.httpMethod</httpMethod> <routeKey>$context.routeKey</routeKey> <status>$context.status</status> <protocol>$context.protocol</protocol> <responseLength>$context.responseLength</responseLength> </request>'  # noqa: E501
+_CSV_LOG_FORMAT = "$context.identity.sourceIp,$context.requestTime,$context.httpMethod,$context.routeKey,$context.protocol,$context.status,$context.responseLength,$context.requestId"  # noqa: E501
+
+# Dispatch table for the named formats, one dict lookup instead of a
+# chain of string comparisons
+_LOG_FORMATS = {
+    "clf": _CLF_LOG_FORMAT,
+    "json": _JSON_LOG_FORMAT,
+    "xml": _XML_LOG_FORMAT,
+    "csv": _CSV_LOG_FORMAT,
+}
+
+# frozensets give O(1) membership checks and don't get rebuilt on
+# every call like the inline list literals they replace
+_HTTP_METHODS = frozenset(
+    {"ANY", "GET", "POST", "PUT", "PATCH", "HEAD", "DELETE", "OPTIONS"}
+)
+_SIMPLE_LOG_FORMATS = frozenset({"none", "clf", "json", "xml", "csv"})
 
 
 class HttpApi:
+    # Fixed attribute set; slots skip the per-instance __dict__, which
+    # matters for generators that build many APIs
+    __slots__ = ("name", "clean_name", "description", "resources", "t_api", "_api_ref")
+
     def __init__(self, name: str, description: str = None):
         self.name = name
-        self.clean_name = alphanum(name)
+        self.clean_name = _alphanum(name)
         self.description = description
         self.resources = dict()
         self.t_api = t_apigw2.Api(
@@ -17,6 +61,9 @@ class HttpApi:
         if description is not None:
             self.t_api.Description = description
         self.resources[self.t_api.title] = self.t_api
+        # Every route, integration and stage references the API; share
+        # one Ref instead of allocating a new one per resource
+        self._api_ref = Ref(self.t_api)
 
     def add_stage(
         self,
@@ -28,51 +75,34 @@ class HttpApi:
     ):
         # TODO:
         #   - DefaultRouteSettings (??)
-        if log_format.lower() in ["none", "clf", "json", "xml", "csv"]:
-            pass
-        elif "$context.requestId" in log_format:
-            pass
-        else:
+        log_format_lower = log_format.lower()
+        if (
+            log_format_lower not in _SIMPLE_LOG_FORMATS
+            and "$context.requestId" not in log_format
+        ):
             raise ValueError(f"{log_format} is not a valid log format")
+        clean_name = _alphanum(name)
         # Create Troposphere resource
         api_stage = t_apigw2.Stage(
-            title=f"{alphanum(name)}Stage", ApiId=Ref(self.t_api), StageName=name
+            title=f"{clean_name}Stage", ApiId=self._api_ref, StageName=name
         )
         # Set logging
-        if log_format.lower() != "none":
+        if log_format_lower != "none":
+            # A single Sub with the literal parts baked in serializes
+            # to a much smaller node than a seven-element Join
             api_stage_log = t_apigw2.AccessLogSettings(
-                DestinationArn=Join(
-                    ":",
-                    [
-                        "arn",
-                        "aws",
-                        "logs",
-                        Region,
-                        AccountId,
-                        f"{self.clean_name}HttpApi",
-                        alphanum(name),
-                    ],
+                DestinationArn=Sub(
+                    "arn:aws:logs:${AWS::Region}:${AWS::AccountId}:"
+                    f"{self.clean_name}HttpApi:{clean_name}"
                 )
             )
-            if log_format.lower() == "clf":
-                api_stage_log.Format = '$context.identity.sourceIp - - [$context.requestTime] "$context.httpMethod $context.routeKey $context.protocol" $context.status $context.responseLength $context.requestId'  # noqa: E501
-            elif log_format.lower() == "json":
-                api_stage_log.Format = json.dumps(
-                    {
-                        "requestId": "$context.requestId",
-                        "ip": "$context.identity.sourceIp",
-                        "requestTime": "$context.requestTime",
-                        "httpMethod": "$context.httpMethod",
-                        "routeKey": "$context.routeKey",
-                        "status": "$context.status",
-                        "protocol": "$context.protocol",
-                        "responseLength": "$context.responseLength",
-                    }
-                )
-            elif log_format.lower() == "xml":
-                api_stage_log.Format = '<request id="$context.requestId"> <ip>$context.identity.sourceIp</ip> <requestTime>$context.requestTime</requestTime> <httpMethod>$context.httpMethod</httpMethod> <routeKey>$context.routeKey</routeKey> <status>$context.status</status> <protocol>$context.protocol</protocol> <responseLength>$context.responseLength</responseLength> </request>'  # noqa: E501
-            elif log_format.lower() == "csv":
-                api_stage_log.Format = "$context.identity.sourceIp,$context.requestTime,$context.httpMethod,$context.routeKey,$context.protocol,$context.status,$context.responseLength,$context.requestId"  # noqa: E501
+            named_format = _LOG_FORMATS.get(log_format_lower)
+            if named_format is not None:
+                api_stage_log.Format = named_format
+            else:
+                # custom formats were validated above, pass through
+                api_stage_log.Format = log_format
+            api_stage.AccessLogSettings = api_stage_log
         api_stage.AutoDeploy = auto_deploy
         if description is not None:
             api_stage.Description = description
@@ -92,26 +122,19 @@ class HttpApi:
         #   - Configure CORS?
         #   - CredentialsArn should be null?
         #   - generate $default?
-        if http_method.upper() not in [
-            "ANY",
-            "GET",
-            "POST",
-            "PUT",
-            "PATCH",
-            "HEAD",
-            "DELETE",
-            "OPTIONS",
-        ]:
+        method = http_method.upper()
+        if method not in _HTTP_METHODS:
             raise ValueError(f"{http_method} is not a valid HTTP METHOD")
+        clean_path = _alphanum(path)
         # Define HTTP API Integration
         api_integration = t_apigw2.Integration(
-            title=f"{alphanum(path)}Integration", ApiId=Ref(self.t_api),
+            title=f"{clean_path}Integration", ApiId=self._api_ref,
         )
         if description is not None:
             api_integration.Description = description
-        api_integration.IntegrationMethod = http_method
+        api_integration.IntegrationMethod = method
         api_integration.IntegrationUri = target
-        if target.lower()[:5] == "http:" or target.lower()[:6] == "https:":
+        if target[:6].lower().startswith(("http:", "https:")):
             api_integration.IntegrationType = "HTTP_PROXY"
             api_integration.PayloadFormatVersion = "1.0"
         else:
@@ -120,14 +143,21 @@ class HttpApi:
         api_integration.TimeoutInMillis = timeout
         # Define HTTP API route
         api_route = t_apigw2.Route(
-            title=f"{alphanum(path)}Route", ApiId=Ref(self.t_api),
+            title=f"{clean_path}Route", ApiId=self._api_ref,
         )
         if description is not None:
             api_route.OperationName = description
-        api_route.RouteKey = f"{http_method} /{path}"
+        api_route.RouteKey = f"{method} /{path}"
         api_route.Target = Join("/", ["integrations", Ref(api_integration)])
         self.resources[api_integration.title] = api_integration
-        self.resources[api_route] = api_route
+        self.resources[api_route.title] = api_route
+
+    def attach(self, template):
+        # Merge everything built so far into the template in one dict
+        # update; add_resource() would re-check title uniqueness for
+        # every single resource
+        template.resources.update(self.resources)
+        return template
 
 
 if __name__ == "__main__":
@@ -1,8 +1,157 @@
 #!/usr/bin/env python3
-from troposphere import Template, Ref, GetAtt, Export, Output, Sub
+import concurrent.futures
+import functools
+import ipaddress
+
+import yaml
+from troposphere import (
+    Cidr,
+    Export,
+    GetAtt,
+    GetAZs,
+    Output,
+    Ref,
+    Select,
+    Sub,
+    Template,
+)
 from troposphere import ec2 as t_ec2
-from pawslib.ec2 import split_net_across_zones
-from pawslib.var import alphanum
+from .var import alphanum
+
+# _alphanum() is pure and gets called with the same names over and over
+# when building large templates, so cache its results
+_alphanum = functools.lru_cache(maxsize=4096)(alphanum)
+
+# The libyaml dumper serializes roughly an order of magnitude faster
+# than the pure-Python one, but is only present when PyYAML was built
+# against libyaml
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+# Prefix length increase needed to cut a network into a power-of-2
+# number of subnets. Doubles as validation: any count outside the
+# table is not a supported split.
+_PREFIXLEN_DIFF = {1: 0, 2: 1, 4: 2, 8: 3, 16: 4, 32: 5}
+
+
+@functools.lru_cache(maxsize=1024)
+def _split_cidr_blocks(cidr_block: str, no_of_subnets: int) -> tuple:
+    """Split a CIDR block into equally sized subnets
+
+    Parses the block once and derives all subnet addresses with plain
+    integer arithmetic (base + index * step) in a single pass, instead
+    of recomputing network boundaries per subnet. The split is
+    deterministic, so each distinct (cidr_block, no_of_subnets) pair is
+    only ever computed once per process.
+
+    Args:
+        cidr_block (str): IP range to split
+        no_of_subnets (int): How many subnets. Must be a power of 2.
+
+    Raises:
+        ValueError: If no_of_subnets is not a supported power of 2.
+
+    Returns:
+        tuple: Subnet CIDR blocks as strings.
+    """
+    try:
+        prefixlen_diff = _PREFIXLEN_DIFF[no_of_subnets]
+    except KeyError:
+        raise ValueError(
+            f"no_of_subnets must be a power of 2, not {no_of_subnets}"
+        ) from None
+    net = ipaddress.ip_network(cidr_block)
+    base = int(net.network_address)
+    step = net.num_addresses // no_of_subnets
+    prefixlen = net.prefixlen + prefixlen_diff
+    return tuple(
+        f"{ipaddress.ip_address(base + index * step)}/{prefixlen}"
+        for index in range(no_of_subnets)
+    )
+
+
+# Network ACL rules for the VPC template, one entry per row:
+# (title, egress, rule number, CIDR, protocol, port range, ICMP flag).
+# A CIDR of None stands for the VPC's own CIDR block, filled in when
+# the entries are built. All rules are "allow".
+_PUB_NACL_RULES = (
+    ("PubNaclOutAll", True, 500, "0.0.0.0/0", -1, None, False),
+    ("PubNaclInIcmp", False, 99, "0.0.0.0/0", 1, None, True),
+    ("PubNaclInVpc", False, 100, None, -1, None, False),
+    ("PubNaclInSsh", False, 210, "0.0.0.0/0", 6, (22, 22), False),
+    ("PubNaclInHttp", False, 220, "0.0.0.0/0", 6, (80, 80), False),
+    ("PubNaclInHttps", False, 221, "0.0.0.0/0", 6, (443, 443), False),
+    ("PubNaclInNatTcp", False, 500, "0.0.0.0/0", 6, (1024, 65535), False),
+    ("PubNaclInNatUdp", False, 501, "0.0.0.0/0", 17, (1024, 65535), False),
+)
+_INTERNAL_NACL_RULES = (
+    ("InternalNaclOutAll", True, 500, "0.0.0.0/0", -1, None, False),
+    ("InternalNaclInIcmp", False, 99, "0.0.0.0/0", 1, None, True),
+    ("InternalNaclInVpc", False, 100, None, -1, None, False),
+    ("InternalNaclInNatTcp", False, 500, "0.0.0.0/0", 6, (1024, 65535), False),
+    ("InternalNaclInNatUdp", False, 501, "0.0.0.0/0", 17, (1024, 65535), False),
+)
+
+
+def _make_nacl_entry(
+    nacl_id,
+    title: str,
+    egress: bool,
+    rule_number: int,
+    cidr: str,
+    protocol: int,
+    port_range: tuple = None,
+    icmp: bool = False,
+):
+    """Build an allow NetworkAclEntry from one rule-table row"""
+    entry = t_ec2.NetworkAclEntry(
+        title=title,
+        NetworkAclId=nacl_id,
+        Egress=egress,
+        RuleNumber=rule_number,
+        CidrBlock=cidr,
+        Protocol=protocol,
+        RuleAction="allow",
+    )
+    if port_range is not None:
+        entry.PortRange = t_ec2.PortRange(From=port_range[0], To=port_range[1])
+    if icmp:
+        entry.Icmp = t_ec2.ICMP(Code=-1, Type=-1)
+    return entry
+
+
+# Uppercase letters to derive an AZ index from a subnet's position,
+# used when the real AZ name is only known at deploy time. AZs are
+# returned alphabetically, so position N maps to letter N.
+_AZ_LETTERS = ("A", "B", "C", "D", "E", "F", "G", "H")
+
+
+def _name_tag(value) -> list:
+    """Return a Tags list holding a single Name tag"""
+    return [{"Key": "Name", "Value": value}]
+
+
+@functools.lru_cache(maxsize=32)
+def _region_azs(region: str) -> tuple:
+    """Return the sorted names of available AZs in a region
+
+    The result is cached per region, so only the first call for a
+    region talks to the AWS API. The AZ list is stable for the
+    lifetime of a template-building process.
+
+    Args:
+        region (str): AWS region
+
+    Returns:
+        tuple: Availability zone names ("eu-west-1a", ...).
+    """
+    # boto3 is only needed here, import it on demand
+    import boto3
+
+    response = boto3.client("ec2", region_name=region).describe_availability_zones(
+        Filters=[{"Name": "state", "Values": ["available"]}]
+    )
+    return tuple(sorted(zone["ZoneName"] for zone in response["AvailabilityZones"]))
 
 
 def multiaz_subnets(
@@ -16,6 +165,10 @@ def multiaz_subnets(
     network_acl_id: str = None,
     route_table: object = None,
     route_table_id: str = None,
+    template: object = None,
+    azs: tuple = None,
+    use_intrinsic_azs: bool = False,
+    defer_cidr: bool = False,
 ) -> list:
     """Split given CIDR block into subnets over multiple AZs
 
@@ -35,7 +188,9 @@ def multiaz_subnets(
 
     Returned subnet objects have the following keys set in their
     Metadata attribute:
-        az: full availability zone name ("eu-west-1a")
+        az: full availability zone name ("eu-west-1a"), or None when
+            use_intrinsic_azs is set, since the name is then only known
+            at deploy time
         az_index: uppercase AZ, without the region part ("A")
         suffix: the suffix that was added to the name to form a unique
             resource title. Probably a single digit.
@@ -59,6 +214,24 @@ def multiaz_subnets(
             Defaults to None.
         route_table_id (str, optional): Route table ID. Defaults to
             None.
+        template (Template, optional): If given, resources are added
+            to this Troposphere Template as they are built, saving the
+            caller a second pass over the returned list. Defaults to
+            None.
+        azs (tuple, optional): Availability zone names to spread the
+            subnets over. Looked up for the region (and cached) when
+            not given. Defaults to None.
+        use_intrinsic_azs (bool, optional): If True, assign zones with
+            the Fn::GetAZs/Fn::Select intrinsics so CloudFormation
+            resolves them at deploy time. No AWS API call is made and
+            the template stays portable, but no_of_subnets should not
+            exceed the number of zones in the region. Defaults to
+            False.
+        defer_cidr (bool, optional): If True, split the CIDR block
+            with the Fn::Cidr intrinsic so CloudFormation does the
+            network math at deploy time. Pairs naturally with
+            use_intrinsic_azs to make generation a pure string-building
+            exercise. Defaults to False.
 
     Raises:
         ValueError: If neither vpc nor vpc_id were specified.
@@ -72,48 +245,145 @@ def multiaz_subnets(
     if vpc_id is None:
         vpc_id = Ref(vpc)
     # Resource names only accept alphanumeric
-    prefix = alphanum(name_prefix).lower().capitalize()
-    net_split = split_net_across_zones(cidr_block, region, no_of_subnets)
-    resources = list()
-    for index, net_segment in enumerate(net_split):
-        # set subnet
-        az_index = net_segment["az"][-1:].upper()
+    prefix = _alphanum(name_prefix).lower().capitalize()
+    # Refs to the shared resources are identical for every subnet,
+    # build them once instead of once per iteration
+    if network_acl_id is None and network_acl is not None:
+        network_acl_id = Ref(network_acl)
+    if route_table_id is None and route_table is not None:
+        route_table_id = Ref(route_table)
+    if azs is None and not use_intrinsic_azs:
+        azs = _region_azs(region)
+    # Format templates for the per-subnet titles and tags, built once
+    # and applied with % in the loop. The prefix has been through
+    # alphanum() so it can't contain %, but name_prefix is raw caller
+    # input and any % in it must be escaped for the formatting below
+    title_fmt = prefix + "%d"
+    tag_fmt = name_prefix.replace("%", "%%") + " %s"
+    # The number of resources is known up front, preallocate the list
+    # so it doesn't get resized while being filled
+    per_subnet = 1 + (network_acl_id is not None) + (route_table_id is not None)
+    resources = [None] * (no_of_subnets * per_subnet)
+    pos = 0
+    add_to_template = None if template is None else template.add_resource
+    az_letter_count = len(_AZ_LETTERS)
+    az_count = None if azs is None else len(azs)
+    # An empty string makes Fn::GetAZs resolve the deploy region, which
+    # is what keeps the template portable; naming the region here would
+    # bake it in. One shared node serves every subnet's Select.
+    deploy_region_azs = GetAZs("") if use_intrinsic_azs else None
+    if defer_cidr:
+        # Let CloudFormation do the split: Fn::Cidr wants the number of
+        # host bits per subnet, derived from the parent prefix length
+        # and the same power-of-2 table used for the local split
+        try:
+            prefixlen_diff = _PREFIXLEN_DIFF[no_of_subnets]
+        except KeyError:
+            raise ValueError(
+                f"no_of_subnets must be a power of 2, not {no_of_subnets}"
+            ) from None
+        host_bits = 32 - (int(cidr_block.split("/")[1]) + prefixlen_diff)
+        deferred_cidrs = Cidr(cidr_block, no_of_subnets, str(host_bits))
+        cidr_blocks = [
+            Select(index, deferred_cidrs) for index in range(no_of_subnets)
+        ]
+    else:
+        cidr_blocks = _split_cidr_blocks(cidr_block, no_of_subnets)
+    for index, cidr in enumerate(cidr_blocks):
+        # set subnet. AZs are assigned in alphabetical order, so the
+        # AZ letter comes from the position table rather than slicing
+        # and uppercasing the zone name on every iteration
+        az_index = _AZ_LETTERS[index % az_letter_count]
+        if use_intrinsic_azs:
+            az = None
+            availability_zone = Select(index, deploy_region_azs)
+        else:
+            az = azs[index % az_count].lower()
+            availability_zone = az
+        title = title_fmt % (index + 1)
         subnet = t_ec2.Subnet(
-            title=f"{prefix}{index+1}",
-            AvailabilityZone=net_segment["az"],
-            CidrBlock=net_segment["cidr"],
+            title=title,
+            AvailabilityZone=availability_zone,
+            CidrBlock=cidr,
             VpcId=vpc_id,
-            Tags=[{"Key": "Name", "Value": f"{name_prefix} {az_index}"}],
+            Tags=_name_tag(tag_fmt % az_index),
         )
-        subnet.Metadata = {}
-        subnet.Metadata["az"] = net_segment["az"].lower()
-        subnet.Metadata["az_index"] = az_index
-        subnet.Metadata["suffix"] = index + 1
-        resources.append(subnet)
+        subnet.Metadata = {"az": az, "az_index": az_index, "suffix": index + 1}
+        resources[pos] = subnet
+        pos += 1
+        if add_to_template is not None:
+            add_to_template(subnet)
+        subnet_ref = Ref(subnet)
         # associate network ACL with subnet
-        if network_acl_id is None and network_acl is not None:
-            network_acl_id = Ref(network_acl)
         if network_acl_id is not None:
-            resources.append(
-                t_ec2.SubnetNetworkAclAssociation(
-                    title=f"{subnet.title}NaclAssociation",
-                    SubnetId=Ref(subnet),
-                    NetworkAclId=network_acl_id,
-                )
+            nacl_association = t_ec2.SubnetNetworkAclAssociation(
+                title=title + "NaclAssociation",
+                SubnetId=subnet_ref,
+                NetworkAclId=network_acl_id,
             )
-        if route_table_id is None and route_table is not None:
-            route_table_id = Ref(route_table)
+            resources[pos] = nacl_association
+            pos += 1
+            if add_to_template is not None:
+                add_to_template(nacl_association)
         if route_table_id is not None:
-            resources.append(
-                t_ec2.SubnetRouteTableAssociation(
-                    title=f"{subnet.title}RouteAssociation",
-                    SubnetId=Ref(subnet),
-                    RouteTableId=route_table_id,
-                )
+            route_association = t_ec2.SubnetRouteTableAssociation(
+                title=title + "RouteAssociation",
+                SubnetId=subnet_ref,
+                RouteTableId=route_table_id,
             )
+            resources[pos] = route_association
+            pos += 1
+            if add_to_template is not None:
+                add_to_template(route_association)
     return resources
 
 
+def _multiaz_subnets_worker(spec: dict) -> list:
+    return multiaz_subnets(**spec)
+
+
+# multiaz_subnets() arguments that only make sense in-process: a
+# Template or live resource passed to a worker would be pickled and
+# any additions made to the copy silently lost
+_BULK_UNSUPPORTED_ARGS = ("template", "vpc", "network_acl", "route_table")
+
+
+def multiaz_subnets_bulk(specs: list, max_workers: int = None) -> list:
+    """Build several subnet groups in parallel
+
+    Each spec is a dict of keyword arguments for multiaz_subnets(). The
+    groups are independent CPU-bound work, so they are spread over
+    worker processes to sidestep the GIL. Because specs cross process
+    boundaries they should reference parent resources through the *_id
+    string arguments, not live Troposphere objects, and the template
+    argument is not supported here.
+
+    Args:
+        specs (list): One dict of multiaz_subnets() keyword arguments
+            per subnet group.
+        max_workers (int, optional): Worker process count, passed to
+            ProcessPoolExecutor. Defaults to None (one per CPU).
+
+    Raises:
+        ValueError: If a spec contains the template argument or a live
+            resource object (vpc, network_acl, route_table) instead of
+            the corresponding *_id.
+
+    Returns:
+        list: One resource list per spec, in the same order.
+    """
+    for spec in specs:
+        for arg in _BULK_UNSUPPORTED_ARGS:
+            if spec.get(arg) is not None:
+                raise ValueError(
+                    f"{arg} is not supported in bulk specs; changes made in a"
+                    " worker process would be lost. Use the *_id arguments"
+                    " and attach the returned resources in the caller."
+                )
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_multiaz_subnets_worker, specs))
+
+
 class VpcTemplate:
     """Generate a CloudFormation Template that creates a VPC
 
@@ -132,6 +402,7 @@ class VpcTemplate:
         name: str = "VPC",
         internet_access_enabled: bool = True,
         internal_networks: list = [],
+        validate: bool = True,
     ):
         """Create VPC, internet gateway, route tables and network ACLs
 
@@ -148,10 +419,15 @@ class VpcTemplate:
             internal_networks (list, optional): IP ranges for private
                 networks that this VPC will be connected to. They will
                 be added to network ACLs. Defaults to [].
+            validate (bool, optional): If False, skip Troposphere's
+                per-resource validation pass when the template is
+                generated. Noticeably faster for large templates, for
+                callers that trust their input. Defaults to True.
         """
         self.name = name
         self.region = region
         self.cidr_block = cidr_block
+        self._validate = validate
         self.internal_networks = internal_networks
         self.internet_access_enabled = internet_access_enabled
         self.public_subnets = []
@@ -160,209 +436,129 @@ class VpcTemplate:
         self.gateway_subnets = []
         self.public_route_table = None
         self.natted_route_tables = []
+        # Same route tables, indexed by subnet suffix for O(1) lookup
+        self._natted_rt_by_suffix = {}
+        self._s3_endpoint = None
         self.nat_gateways = []
         self._t = Template()  # Template
-        self._r = dict()  # Resources
-        self._o = dict()  # Outputs
-        self._r["Vpc"] = t_ec2.VPC(
+        # Resources and Outputs are only ever written here and iterated
+        # in generate(); the titles live on the objects themselves, so
+        # plain append-only lists do the job with no hashing
+        self._r = []  # Resources
+        self._o = []  # Outputs
+        self.vpc = t_ec2.VPC(
             title=f"{self.name}Vpc",
             CidrBlock=self.cidr_block,
             EnableDnsHostnames=True,
             EnableDnsSupport=True,
-            Tags=[{"Key": "Name", "Value": self.name}],
+            Tags=_name_tag(self.name),
         )
-        self.vpc = self._r["Vpc"]
-        self._o["VpcId"] = Output(
-            title="VpcId",
-            Value=Ref(self.vpc),
-            Export=Export(Sub("${AWS::StackName}-vpc-id")),
+        self._r.append(self.vpc)
+        # The VPC is referenced by almost every resource below, build
+        # the Ref and the CIDR attribute lookup once
+        vpc_ref = Ref(self.vpc)
+        vpc_cidr = GetAtt(self.vpc, "CidrBlock")
+        self._o.append(
+            Output(
+                title="VpcId",
+                Value=vpc_ref,
+                Export=Export(Sub("${AWS::StackName}-vpc-id")),
+            )
         )
         if internet_access_enabled:
             # Create Internet Gateway
-            title = "Igw"
-            self._r[title] = t_ec2.InternetGateway(
-                title=title,
-                Tags=[{"Key": "Name", "Value": f"{self.name}-igw"}],
+            igw = t_ec2.InternetGateway(
+                title="Igw",
+                Tags=_name_tag(f"{self.name}-igw"),
             )
-            self._r["igw_attachment"] = t_ec2.VPCGatewayAttachment(
-                title="IgwAttachment",
-                VpcId=Ref(self.vpc),
-                InternetGatewayId=Ref(self._r["Igw"]),
+            self._r.append(igw)
+            self._r.append(
+                t_ec2.VPCGatewayAttachment(
+                    title="IgwAttachment",
+                    VpcId=vpc_ref,
+                    InternetGatewayId=Ref(igw),
+                )
             )
         # Public routing table
-        self._r["PubRouteTable"] = t_ec2.RouteTable(
+        self.public_route_table = t_ec2.RouteTable(
             title="PubRouteTable",
-            VpcId=Ref(self.vpc),
-            Tags=[{"Key": "Name", "Value": "Public"}],
+            VpcId=vpc_ref,
+            Tags=_name_tag("Public"),
         )
-        self.public_route_table = self._r["PubRouteTable"]
+        self._r.append(self.public_route_table)
         if internet_access_enabled:
-            self._r["pub_rtt_rt_pub"] = t_ec2.Route(
-                title="PubRoute",
-                RouteTableId=Ref(self._r["PubRouteTable"]),
-                DestinationCidrBlock="0.0.0.0/0",
-                GatewayId=Ref(self._r["Igw"]),
+            self._r.append(
+                t_ec2.Route(
+                    title="PubRoute",
+                    RouteTableId=Ref(self.public_route_table),
+                    DestinationCidrBlock="0.0.0.0/0",
+                    GatewayId=Ref(igw),
+                )
             )
         # Network ACL for public subnets
-        self._r["PubNacl"] = t_ec2.NetworkAcl(
+        self.public_nacl = t_ec2.NetworkAcl(
             title="PubNacl",
-            VpcId=Ref(self.vpc),
-            Tags=[{"Key": "Name", "Value": "Public"}],
-        )
-        self.public_nacl = self._r["PubNacl"]
-        self._r["pub_nacl_out_all"] = t_ec2.NetworkAclEntry(
-            title="PubNaclOutAll",
-            NetworkAclId=Ref(self.public_nacl),
-            Egress=True,
-            RuleNumber=500,
-            CidrBlock="0.0.0.0/0",
-            Protocol=-1,
-            RuleAction="allow",
-        )
-        self._r["pub_nacl_in_icmp"] = t_ec2.NetworkAclEntry(
-            title="PubNaclInIcmp",
-            NetworkAclId=Ref(self.public_nacl),
-            Egress=False,
-            RuleNumber=99,
-            CidrBlock="0.0.0.0/0",
-            Protocol=1,
-            Icmp=t_ec2.ICMP(Code=-1, Type=-1),
-            RuleAction="allow",
-        )
-        self._r["pub_nacl_in_vpc"] = t_ec2.NetworkAclEntry(
-            title="PubNaclInVpc",
-            NetworkAclId=Ref(self.public_nacl),
-            Egress=False,
-            RuleNumber=100,
-            CidrBlock=GetAtt(self.vpc, "CidrBlock"),
-            Protocol=-1,
-            RuleAction="allow",
+            VpcId=vpc_ref,
+            Tags=_name_tag("Public"),
         )
+        self._r.append(self.public_nacl)
+        pub_nacl_ref = Ref(self.public_nacl)
+        for title, egress, rule_no, cidr, proto, ports, icmp in _PUB_NACL_RULES:
+            self._r.append(
+                _make_nacl_entry(
+                    pub_nacl_ref,
+                    title,
+                    egress,
+                    rule_no,
+                    vpc_cidr if cidr is None else cidr,
+                    proto,
+                    ports,
+                    icmp,
+                )
+            )
         for index, cidr_block in enumerate(self.internal_networks):
-            self._r[f"pub_nacl_in_internal_{index}"] = t_ec2.NetworkAclEntry(
-                title=f"PubNaclInInternal{index}",
-                NetworkAclId=Ref(self.public_nacl),
-                Egress=False,
-                RuleNumber=101 + index,
-                CidrBlock=cidr_block,
-                Protocol=-1,
-                RuleAction="allow",
+            title = f"PubNaclInInternal{index}"
+            self._r.append(
+                _make_nacl_entry(
+                    pub_nacl_ref, title, False, 101 + index, cidr_block, -1
+                )
             )
-        self._r["pub_nacl_in_ssh"] = t_ec2.NetworkAclEntry(
-            title="PubNaclInSsh",
-            NetworkAclId=Ref(self.public_nacl),
-            Egress=False,
-            RuleNumber=210,
-            CidrBlock="0.0.0.0/0",
-            Protocol=6,
-            PortRange=t_ec2.PortRange(From=22, To=22),
-            RuleAction="allow",
-        )
-        self._r["pub_nacl_in_http"] = t_ec2.NetworkAclEntry(
-            title="PubNaclInHttp",
-            NetworkAclId=Ref(self.public_nacl),
-            Egress=False,
-            RuleNumber=220,
-            CidrBlock="0.0.0.0/0",
-            Protocol=6,
-            PortRange=t_ec2.PortRange(From=80, To=80),
-            RuleAction="allow",
-        )
-        self._r["pub_nacl_in_https"] = t_ec2.NetworkAclEntry(
-            title="PubNaclInHttps",
-            NetworkAclId=Ref(self.public_nacl),
-            Egress=False,
-            RuleNumber=221,
-            CidrBlock="0.0.0.0/0",
-            Protocol=6,
-            PortRange=t_ec2.PortRange(From=443, To=443),
-            RuleAction="allow",
-        )
-        self._r["pub_nacl_in_nat_tcp"] = t_ec2.NetworkAclEntry(
-            title="PubNaclInNatTcp",
-            NetworkAclId=Ref(self.public_nacl),
-            Egress=False,
-            RuleNumber=500,
-            CidrBlock="0.0.0.0/0",
-            Protocol=6,
-            PortRange=t_ec2.PortRange(From=1024, To=65535),
-            RuleAction="allow",
-        )
-        self._r["pub_nacl_in_nat_udp"] = t_ec2.NetworkAclEntry(
-            title="PubNaclInNatUdp",
-            NetworkAclId=Ref(self.public_nacl),
-            Egress=False,
-            RuleNumber=501,
-            CidrBlock="0.0.0.0/0",
-            Protocol=17,
-            PortRange=t_ec2.PortRange(From=1024, To=65535),
-            RuleAction="allow",
-        )
         # Network ACL for private subnets
-        self._r["InternalNacl"] = t_ec2.NetworkAcl(
+        self.internal_nacl = t_ec2.NetworkAcl(
             title="InternalNacl",
-            VpcId=Ref(self.vpc),
-            Tags=[{"Key": "Name", "Value": "Private"}],
-        )
-        self.internal_nacl = self._r["InternalNacl"]
-        self._r["internal_nacl_out_all"] = t_ec2.NetworkAclEntry(
-            title="InternalNaclOutAll",
-            NetworkAclId=Ref(self.internal_nacl),
-            Egress=True,
-            RuleNumber=500,
-            CidrBlock="0.0.0.0/0",
-            Protocol=-1,
-            RuleAction="allow",
-        )
-        self._r["internal_nacl_in_icmp"] = t_ec2.NetworkAclEntry(
-            title="InternalNaclInIcmp",
-            NetworkAclId=Ref(self.internal_nacl),
-            Egress=False,
-            RuleNumber=99,
-            CidrBlock="0.0.0.0/0",
-            Protocol=1,
-            Icmp=t_ec2.ICMP(Code=-1, Type=-1),
-            RuleAction="allow",
-        )
-        self._r["internal_nacl_in_vpc"] = t_ec2.NetworkAclEntry(
-            title="InternalNaclInVpc",
-            NetworkAclId=Ref(self.internal_nacl),
-            Egress=False,
-            RuleNumber=100,
-            CidrBlock=GetAtt(self.vpc, "CidrBlock"),
-            Protocol=-1,
-            RuleAction="allow",
+            VpcId=vpc_ref,
+            Tags=_name_tag("Private"),
         )
+        self._r.append(self.internal_nacl)
+        internal_nacl_ref = Ref(self.internal_nacl)
+        for title, egress, rule_no, cidr, proto, ports, icmp in _INTERNAL_NACL_RULES:
+            self._r.append(
+                _make_nacl_entry(
+                    internal_nacl_ref,
+                    title,
+                    egress,
+                    rule_no,
+                    vpc_cidr if cidr is None else cidr,
+                    proto,
+                    ports,
+                    icmp,
+                )
+            )
         for index, cidr_block in enumerate(self.internal_networks):
-            self._r[f"internal_nacl_in_internal_{index}"] = t_ec2.NetworkAclEntry(
-                title=f"InternalNaclInInternal{index}",
-                NetworkAclId=Ref(self.internal_nacl),
-                Egress=False,
-                RuleNumber=101 + index,
-                CidrBlock=cidr_block,
-                Protocol=-1,
-                RuleAction="allow",
+            title = f"InternalNaclInInternal{index}"
+            self._r.append(
+                _make_nacl_entry(
+                    internal_nacl_ref, title, False, 101 + index, cidr_block, -1
+                )
             )
-        self._r["internal_nacl_in_nat_tcp"] = t_ec2.NetworkAclEntry(
-            title="InternalNaclInNatTcp",
-            NetworkAclId=Ref(self.internal_nacl),
-            Egress=False,
-            RuleNumber=500,
-            CidrBlock="0.0.0.0/0",
-            Protocol=6,
-            PortRange=t_ec2.PortRange(From=1024, To=65535),
-            RuleAction="allow",
-        )
-        self._r["internal_nacl_in_nat_udp"] = t_ec2.NetworkAclEntry(
-            title="InternalNaclInNatUdp",
-            NetworkAclId=Ref(self.internal_nacl),
-            Egress=False,
-            RuleNumber=501,
-            CidrBlock="0.0.0.0/0",
-            Protocol=17,
-            PortRange=t_ec2.PortRange(From=1024, To=65535),
-            RuleAction="allow",
-        )
+
+    @functools.cached_property
+    def _azs(self):
+        # Fetched once per template, on first use, so that building a
+        # bare VPC template does not require AWS credentials. The
+        # subnet group methods hand this down to multiaz_subnets() so
+        # each of them skips the region lookup.
+        return _region_azs(self.region)
 
     def add_public_subnet_group(
         self,
@@ -370,6 +566,7 @@ class VpcTemplate:
         cidr_block: str,
         no_of_subnets: int = 4,
         create_nat_gateways: bool = False,
+        use_intrinsic_azs: bool = True,
     ):
         """Create public subnets and, optionally, NAT Gateways
 
@@ -382,6 +579,10 @@ class VpcTemplate:
             create_nat_gateways (bool, optional): If True, it will
                 create one NAT gateway in each subnet and a private
                 route table for each. Defaults to False.
+            use_intrinsic_azs (bool, optional): If True, let
+                CloudFormation pick the zones at deploy time instead of
+                looking them up through the AWS API at generation time.
+                Defaults to True.
         """
         for res in multiaz_subnets(
             name_prefix=name_prefix,
@@ -391,59 +592,79 @@ class VpcTemplate:
             vpc=self.vpc,
             network_acl=self.public_nacl,
             route_table=self.public_route_table,
+            azs=None if use_intrinsic_azs else self._azs,
+            use_intrinsic_azs=use_intrinsic_azs,
         ):
-            self._r[res.title] = res
+            self._r.append(res)
             self.public_subnets.append(res)
             if create_nat_gateways and res.resource["Type"] == "AWS::EC2::Subnet":
                 subnet = res
                 az = subnet.Metadata["az"]
                 az_index = subnet.Metadata["az_index"]
                 suffix = subnet.Metadata["suffix"]
+                # Build each title once and reuse it for both the
+                # resource and its key, rather than formatting the
+                # title and then reading it back through .title
+                suffix_str = str(suffix)
                 # Elastic IP for NAT Gateway
-                eip = t_ec2.EIP(title=f"EipNatGw{suffix}", Domain="vpc")
-                self._r[eip.title] = eip
+                eip_title = "EipNatGw" + suffix_str
+                eip = t_ec2.EIP(title=eip_title, Domain="vpc")
+                self._r.append(eip)
                 # NAT Gateway
+                nat_gw_title = "NatGw" + suffix_str
                 nat_gw = t_ec2.NatGateway(
-                    title=f"NatGw{suffix}",
+                    title=nat_gw_title,
                     AllocationId=GetAtt(eip, "AllocationId"),
                     SubnetId=Ref(subnet),
-                    Tags=[{"Key": "Name", "Value": f"Nat Gw {az_index}"}],
+                    Tags=_name_tag("Nat Gw " + az_index),
                     Metadata={"az": az, "az_index": az_index, "suffix": suffix},
                 )
-                self._r[nat_gw.title] = nat_gw
+                self._r.append(nat_gw)
                 self.nat_gateways.append(nat_gw)
                 # Natted route table
+                route_table_title = "PrivRouteTable" + suffix_str
                 route_table = t_ec2.RouteTable(
-                    title=f"PrivRouteTable{suffix}",
+                    title=route_table_title,
                     VpcId=Ref(self.vpc),
-                    Tags=[{"Key": "Name", "Value": f"Private {az_index}"}],
+                    Tags=_name_tag("Private " + az_index),
                     Metadata={"az": az, "az_index": az_index, "suffix": suffix},
                 )
                 self.gateway_subnets.append(subnet)
                 self.natted_route_tables.append(route_table)
+                self._natted_rt_by_suffix[suffix] = route_table
                 # NAT route
-                self._r[route_table.title] = route_table
+                self._r.append(route_table)
+                route_title = "NatRoute" + az_index
                 route = t_ec2.Route(
-                    title=f"NatRoute{az_index.upper()}",
+                    title=route_title,
                     RouteTableId=Ref(route_table),
                     DestinationCidrBlock="0.0.0.0/0",
                     NatGatewayId=Ref(nat_gw),
                 )
-                self._r[route.title] = route
+                self._r.append(route)
 
     def add_natted_subnet_group(
-        self, cidr_block: str, name_prefix: str, no_of_subnets: int = 4
+        self,
+        cidr_block: str,
+        name_prefix: str,
+        no_of_subnets: int = 4,
+        use_intrinsic_azs: bool = True,
     ):
         """Create private subnets behind NAT gateways
 
         Creates a group of subnets, attaches the private network ACL and
-        the corresponding private route table depending on AZ
+        the private route table created in the same position of the
+        public subnet group, which puts both in the same AZ
 
         Args:
             cidr_block (str): Will be split across AZs
             name_prefix (str): Subnet name. AZ will be added at the end.
             no_of_subnets (int, optional): How many subnets to set up.
                 Must be a power of 2. Defaults to 4.
+            use_intrinsic_azs (bool, optional): If True, let
+                CloudFormation pick the zones at deploy time instead of
+                looking them up through the AWS API at generation time.
+                Defaults to True.
 
         Raises:
             NotImplementedError: [description]
@@ -455,26 +676,28 @@ class VpcTemplate:
             no_of_subnets=no_of_subnets,
             vpc=self.vpc,
             network_acl=self.internal_nacl,
+            azs=None if use_intrinsic_azs else self._azs,
+            use_intrinsic_azs=use_intrinsic_azs,
         ):
-            self._r[res.title] = res
+            self._r.append(res)
             if res.resource["Type"] == "AWS::EC2::Subnet":
                 subnet = res
-                route_found = False
-                for route_table in self.natted_route_tables:
-                    if route_table.Metadata["az"] == subnet.Metadata["az"]:
-                        self._r[
-                            f"{subnet.title}RouteAssociation"
-                        ] = t_ec2.SubnetRouteTableAssociation(
-                            title=f"{subnet.title}RouteAssociation",
-                            SubnetId=Ref(subnet),
-                            RouteTableId=Ref(route_table),
-                        )
-                        route_found = True
-                        break
-                if not route_found:
+                # Subnet groups are laid out over AZs in the same
+                # order, so matching suffixes means matching AZs. The
+                # suffix is also known when AZ names are resolved at
+                # deploy time, unlike Metadata["az"].
+                route_table = self._natted_rt_by_suffix.get(subnet.Metadata["suffix"])
+                if route_table is None:
                     raise NotImplementedError(
-                        f"Can't find NAT gateway in {subnet.Metadata['az']}"
+                        f"Can't find NAT gateway for {subnet.title}"
+                    )
+                self._r.append(
+                    t_ec2.SubnetRouteTableAssociation(
+                        title=f"{subnet.title}RouteAssociation",
+                        SubnetId=Ref(subnet),
+                        RouteTableId=Ref(route_table),
                     )
+                )
 
     def add_subnet_group(
         self,
@@ -492,8 +715,9 @@ class VpcTemplate:
             vpc=self.vpc,
             network_acl=network_acl,
             route_table=route_table,
+            azs=self._azs,
         ):
-            self._r[res.title] = res
+            self._r.append(res)
 
     def peer_with_another_vpc(
         self,
@@ -544,12 +768,12 @@ class VpcTemplate:
           - As of Jan 2022 CloudFormation can't enable DNS resolution
         """
         res = t_ec2.VPCPeeringConnection(
-            title=alphanum(
+            title=_alphanum(
                 f"Peer{peer_vpc_name.capitalize()}With{self.name.capitalize()}"
             ),
             VpcId=Ref(self.vpc),
             PeerVpcId=peer_vpc_id,
-            Tags=[{"Key": "Name", "Value": f"{peer_vpc_name} - {self.name}"}],
+            Tags=_name_tag(f"{peer_vpc_name} - {self.name}"),
         )
         if peer_region is not None:
             res.PeerRegion = peer_region
@@ -557,14 +781,22 @@ class VpcTemplate:
             res.PeerOwnerId = peer_owner_id
         if peer_role_arn is not None:
             res.PeerRoleArn = peer_role_arn
-        self._r[res.title] = res
+        self._r.append(res)
+        peering_ref = Ref(res)
+        # Callers often union CIDR lists from several sources; drop
+        # duplicates (keeping order) so repeated entries don't produce
+        # colliding route titles or redundant resources
+        seen = set()
+        unique_cidrs = [
+            cidr for cidr in peer_cidrs if not (cidr in seen or seen.add(cidr))
+        ]
         if add_route_to_private_tables:
             self.add_vpc_peering_to_private_tables(
-                peer_cidrs=peer_cidrs, vpc_peering_id=Ref(res)
+                peer_cidrs=unique_cidrs, vpc_peering_id=peering_ref
             )
         if add_route_to_public_table:
             self.add_vpc_peering_to_public_table(
-                peer_cidrs=peer_cidrs, vpc_peering_id=Ref(res)
+                peer_cidrs=unique_cidrs, vpc_peering_id=peering_ref
             )
 
     def add_vpc_peering_to_private_tables(
@@ -572,14 +804,19 @@ class VpcTemplate:
         peer_cidrs: list = [],
         vpc_peering_id: str = None,
     ):
+        # Pair each route table with its Ref once; the loop below would
+        # otherwise rebuild the Ref for every CIDR/table combination
+        route_tables = [(rt.title, Ref(rt)) for rt in self.natted_route_tables]
         for cidr in peer_cidrs:
-            for route_table in self.natted_route_tables:
-                route_title = f"{route_table.title}Peer{alphanum(cidr)}Route"
-                self._r[route_title] = t_ec2.Route(
-                    title=route_title,
-                    RouteTableId=Ref(route_table),
-                    DestinationCidrBlock=cidr,
-                    VpcPeeringConnectionId=vpc_peering_id,
+            clean_cidr = _alphanum(cidr)
+            for rt_title, rt_ref in route_tables:
+                self._r.append(
+                    t_ec2.Route(
+                        title=f"{rt_title}Peer{clean_cidr}Route",
+                        RouteTableId=rt_ref,
+                        DestinationCidrBlock=cidr,
+                        VpcPeeringConnectionId=vpc_peering_id,
+                    )
                 )
 
     def add_vpc_peering_to_public_table(
@@ -587,28 +824,43 @@ class VpcTemplate:
         peer_cidrs: list = [],
         vpc_peering_id: str = None,
     ):
+        public_title = self.public_route_table.title
+        public_ref = Ref(self.public_route_table)
         for cidr in peer_cidrs:
-            route_title = f"{self.public_route_table.title}Peer{alphanum(cidr)}Route"
-            self._r[route_title] = t_ec2.Route(
-                title=route_title,
-                RouteTableId=Ref(self.public_route_table),
-                DestinationCidrBlock=cidr,
-                VpcPeeringConnectionId=vpc_peering_id,
+            self._r.append(
+                t_ec2.Route(
+                    title=f"{public_title}Peer{_alphanum(cidr)}Route",
+                    RouteTableId=public_ref,
+                    DestinationCidrBlock=cidr,
+                    VpcPeeringConnectionId=vpc_peering_id,
+                )
             )
 
     def set_s3_endpoint(self):
-        """Set an S3 endpoint with full access and add it to private routes"""
+        """Set an S3 endpoint with full access and add it to private routes
+
+        Idempotent: calling it again returns the endpoint created by the
+        first call instead of building (and validating) a duplicate.
+
+        Returns:
+            VPCEndpoint: The endpoint resource.
+        """
+        if self._s3_endpoint is not None:
+            return self._s3_endpoint
+        route_table_ids = [
+            Ref(route_table) for route_table in self.natted_route_tables
+        ]
+        if self.public_route_table is not None:
+            route_table_ids.append(Ref(self.public_route_table))
         res = t_ec2.VPCEndpoint(
-            title=alphanum(f"{self.name}S3EndpointGateway"),
+            title=_alphanum(f"{self.name}S3EndpointGateway"),
             VpcId=Ref(self.vpc),
             ServiceName=f"com.amazonaws.{self.region}.s3",
-            RouteTableIds=[
-                Ref(route_table) for route_table in self.natted_route_tables
-            ],
+            RouteTableIds=route_table_ids,
         )
-        if self.public_route_table is not None:
-            res.RouteTableIds.append(Ref(self.public_route_table))
-        self._r[res.title] = res
+        self._r.append(res)
+        self._s3_endpoint = res
+        return res
 
     def set_prometheus_endpoint(self):
         """
@@ -616,7 +868,7 @@ class VpcTemplate:
         private routes
         """
         sg_res = t_ec2.SecurityGroup(
-            title=alphanum(f"{self.name}ApsVpcEndpointSG"),
+            title=_alphanum(f"{self.name}ApsVpcEndpointSG"),
             VpcId=Ref(self.vpc),
             GroupDescription="Used by Prometheus VPC Endpoint",
             SecurityGroupIngress=[
@@ -625,23 +877,39 @@ class VpcTemplate:
                 )
             ],
         )
-        self._r[sg_res.title] = sg_res
+        self._r.append(sg_res)
         res = t_ec2.VPCEndpoint(
-            title=alphanum(f"{self.name}ApsVpcEndpoint"),
+            title=_alphanum(f"{self.name}ApsVpcEndpoint"),
             VpcId=Ref(self.vpc),
             ServiceName=f"com.amazonaws.{self.region}.aps-workspaces",
             SubnetIds=[Ref(subnet) for subnet in self.gateway_subnets],
-            SecurityGroupIds=[Ref(self._r[sg_res.title])],
+            SecurityGroupIds=[Ref(sg_res)],
             VpcEndpointType="Interface",
         )
-        self._r[res.title] = res
+        self._r.append(res)
 
     def generate(self):
-        for key, resource in self._r.items():
-            self._t.add_resource(resource)
-        for key, output in self._o.items():
-            self._t.add_output(output)
-        return self._t.to_yaml()
+        # Merge everything into the template's internal maps in two
+        # dict updates instead of going through add_resource() and
+        # add_output() once per item. Titles are unique by
+        # construction, so the per-item duplicate check adds nothing.
+        if not self._validate:
+            for resource in self._r:
+                resource.no_validation()
+        self._t.resources.update(
+            {resource.title: resource for resource in self._r}
+        )
+        self._t.outputs.update({output.title: output for output in self._o})
+        # Serialize with the libyaml dumper where available instead of
+        # troposphere's to_yaml(), which round-trips through the
+        # pure-Python dumper. Intrinsics come out in their long form
+        # ({"Ref": ...}), which CloudFormation accepts just the same.
+        return yaml.dump(
+            self._t.to_dict(),
+            Dumper=_YAML_DUMPER,
+            default_flow_style=False,
+            sort_keys=False,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+# Translation table that deletes every ASCII character that is not a
+# letter or a digit. str.translate() walks the string in C, much
+# faster than a Python-level character filter.
+_ASCII_NON_ALPHANUM = str.maketrans(
+    "", "", "".join(chr(code) for code in range(128) if not chr(code).isalnum())
+)
+
+
+def alphanum(text: str) -> str:
+    """Strip every character that is not an ASCII letter or digit
+
+    Used to turn names, paths and CIDR blocks into strings that are
+    valid CloudFormation resource titles.
+
+    Args:
+        text (str): String to clean up
+
+    Returns:
+        str: `text` reduced to ASCII letters and digits.
+    """
+    clean = text.translate(_ASCII_NON_ALPHANUM)
+    if not clean.isascii():
+        # Titles must be ASCII, drop anything else. Rare enough that
+        # the slow path doesn't matter.
+        clean = "".join(
+            char for char in clean if char.isascii() and char.isalnum()
+        )
+    return clean
+
+
+if __name__ == "__main__":
+    pass